@@ -0,0 +1,161 @@
+# Import the required libraries and modules
+import time  # Used for measuring the batch run time
+import sys  # Used for exiting with an error status when the batch fails
+import argparse  # Used for parsing command line options of the batch job
+import multiprocessing  # Used for running sectors in parallel worker processes
+import numpy as np  # Used for vectorized numerical operations
+import pandas as pd  # Used for data manipulation and grouped computations
+from queries import get_db_connection  # Shared database connection helper
+
+# Name of the table the batch job writes its results to
+FEATURES_TABLE = 'company_features'
+
+# Number of years used for the rolling growth and volatility windows
+ROLLING_WINDOW = 3
+
+# Largest year-over-year growth (as a fraction, so 10 is 1000%) kept before averaging; larger
+# values only occur when the previous value was close to zero
+MAX_GROWTH = 10.0
+
+# Absolute z-score above which a company is flagged as an anomaly within its sector
+ANOMALY_THRESHOLD = 3.0
+
+# Default time budget (in seconds) for the complete batch run
+DEFAULT_TIME_BUDGET = 30 * 60
+
+# Columns written to the features table, in order
+FEATURE_COLUMNS = [
+    'cvr', 'industry_sector', 'latest_year', 'years_reported',
+    'profit_growth', 'equity_growth', 'equity_volatility',
+    'max_drawdown', 'current_drawdown',
+    'profit_zscore', 'roa_zscore', 'solvency_zscore',
+    'anomaly_score', 'is_anomaly',
+]
+
+# Function to list the sector codes that have at least one company
+def fetch_sector_codes():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT industry_sector FROM company WHERE industry_sector IS NOT NULL ORDER BY industry_sector")
+    return [row[0] for row in cursor.fetchall()]
+
+# Function to load the full financial history of every company in a sector
+def fetch_sector_financials(sector_code):
+    conn = get_db_connection()
+    query = """
+    SELECT f.cvr, f.year, f.profit_loss, f.equity, f.return_on_assets, f.solvency_ratio
+    FROM financials f
+    JOIN company c ON f.cvr = c.cvr_number
+    WHERE c.industry_sector = ?
+    ORDER BY f.cvr, f.year
+    """
+    return pd.read_sql_query(query, conn, params=(sector_code,))
+
+# Year-over-year growth relative to the size of the previous value, so that growth out of a loss
+# is still positive when the result improves. Previous values close to zero make the growth explode,
+# so it is capped at MAX_GROWTH either way; growth from exactly zero is undefined and left empty.
+def _growth(values, previous):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = (values - previous) / np.abs(previous)
+    growth = np.where(np.isfinite(growth), growth, np.nan)
+    return np.clip(growth, -MAX_GROWTH, MAX_GROWTH)
+
+# Per-company rolling window whose results line up with the original rows
+def _rolling(series_groupby, stat, min_periods):
+    window = series_groupby.rolling(ROLLING_WINDOW, min_periods=min_periods)
+    return getattr(window, stat)().reset_index(level=0, drop=True)
+
+# Z-score of every value against all companies in the sector for the same year
+def _sector_zscore(df, column):
+    by_year = df.groupby('year')[column]
+    mean = by_year.transform('mean').to_numpy()
+    std = by_year.transform('std').to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        zscore = (df[column].to_numpy() - mean) / std
+    return np.where(np.isfinite(zscore), zscore, np.nan)
+
+# Function to compute the trend and anomaly features for one sector
+def compute_sector_features(sector_code):
+    df = fetch_sector_financials(sector_code)
+    if df.empty:
+        return pd.DataFrame(columns=FEATURE_COLUMNS)
+
+    # Rows are ordered by (cvr, year), so shifting inside each group gives the previous year
+    grouped = df.groupby('cvr', sort=False)
+    df['profit_growth'] = _growth(df['profit_loss'].to_numpy(), grouped['profit_loss'].shift().to_numpy())
+    df['equity_growth'] = _growth(df['equity'].to_numpy(), grouped['equity'].shift().to_numpy())
+
+    # Rolling averages and volatility of the growth rates over the last few years
+    grouped = df.groupby('cvr', sort=False)
+    df['equity_volatility'] = _rolling(grouped['equity_growth'], 'std', min_periods=2)
+    df['profit_growth'] = _rolling(grouped['profit_growth'], 'mean', min_periods=1)
+    df['equity_growth'] = _rolling(grouped['equity_growth'], 'mean', min_periods=1)
+
+    # Drawdown of equity from its running peak; only meaningful while the peak is positive
+    peak = grouped['equity'].cummax().to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown = np.where(peak > 0, df['equity'].to_numpy() / peak - 1.0, np.nan)
+    df['current_drawdown'] = drawdown
+    df['max_drawdown'] = df.groupby('cvr', sort=False)['current_drawdown'].cummin()
+
+    # Anomalies relative to the rest of the sector in the same year
+    df['profit_zscore'] = _sector_zscore(df, 'profit_loss')
+    df['roa_zscore'] = _sector_zscore(df, 'return_on_assets')
+    df['solvency_zscore'] = _sector_zscore(df, 'solvency_ratio')
+    df['anomaly_score'] = df[['profit_zscore', 'roa_zscore', 'solvency_zscore']].abs().max(axis=1)
+
+    # Keep the most recent year of every company as its feature row
+    df['years_reported'] = df.groupby('cvr', sort=False)['year'].transform('size')
+    latest = df.groupby('cvr', sort=False).tail(1).rename(columns={'year': 'latest_year'})
+    latest['industry_sector'] = sector_code
+    latest['is_anomaly'] = (latest['anomaly_score'] > ANOMALY_THRESHOLD).astype(int)
+    return latest[FEATURE_COLUMNS].reset_index(drop=True)
+
+# Function to write the computed features to the database, replacing the previous run
+def write_features(features):
+    conn = get_db_connection()
+    features.to_sql(FEATURES_TABLE, conn, if_exists='replace', index=False)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{FEATURES_TABLE}_sector ON {FEATURES_TABLE} (industry_sector)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{FEATURES_TABLE}_cvr ON {FEATURES_TABLE} (cvr)")
+    conn.commit()
+
+# Function to run the feature batch for all sectors on a process pool
+def run_feature_batch(max_workers=None, time_budget=DEFAULT_TIME_BUDGET):
+    started = time.monotonic()
+    sector_codes = fetch_sector_codes()
+
+    pool = multiprocessing.Pool(processes=max_workers)
+    try:
+        results = [pool.apply_async(compute_sector_features, (code,)) for code in sector_codes]
+        deadline = started + time_budget
+        frames = []
+        for result in results:
+            # get() re-raises the first worker error; a timeout means the budget is used up
+            try:
+                frames.append(result.get(timeout=max(deadline - time.monotonic(), 0)))
+            except multiprocessing.TimeoutError:
+                unfinished = sum(not r.ready() for r in results)
+                raise TimeoutError(f"Feature batch exceeded its time budget of {time_budget} seconds "
+                                   f"({unfinished} of {len(results)} sectors unfinished)")
+    finally:
+        # Kill the workers so a sector stuck past the budget cannot keep the job running
+        pool.terminate()
+        pool.join()
+
+    features = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=FEATURE_COLUMNS)
+    # Only replace the previous features once every sector has finished
+    write_features(features)
+    return len(features), time.monotonic() - started
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute trend and anomaly features for every company.")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (defaults to the CPU count)")
+    parser.add_argument('--time-budget', type=float, default=DEFAULT_TIME_BUDGET, help="Maximum run time in seconds")
+    args = parser.parse_args()
+
+    try:
+        row_count, elapsed = run_feature_batch(max_workers=args.workers, time_budget=args.time_budget)
+    except TimeoutError as error:
+        print(error, file=sys.stderr)
+        sys.exit(1)
+    print(f"Wrote {row_count} company feature rows to '{FEATURES_TABLE}' in {elapsed:.1f}s")
@@ -0,0 +1,305 @@
+# Read-only HTTP JSON API over the dashboard query layer.
+# Run it with: python api.py --host 127.0.0.1 --port 8080
+
+# Import the required libraries and modules
+import argparse  # Used for parsing command line options
+import asyncio  # Used for running blocking database queries off the event loop
+import base64  # Used for encoding pagination cursors
+import hashlib  # Used for computing ETags
+import json  # Used for encoding responses and cursors
+import sys  # Used for printing warnings and exiting after the setup step
+import time  # Used for expiring cached responses
+from aiohttp import web  # Lightweight async HTTP server
+from queries import (  # Database queries shared with the dashboard
+    sector_mappings, get_db_connection, get_year_range, fetch_companies_page, fetch_financial_trends,
+    fetch_financial_health_indicators, fetch_company_financial_history, fetch_company_info,
+    fetch_sector_comparison, get_hidden_gems, features_available, fetch_company_features,
+)
+
+# Number of seconds responses may be reused by clients and by the in-process cache
+CACHE_TTL = 300
+
+# Maximum number of responses kept in the in-process cache
+CACHE_MAX_ENTRIES = 1024
+
+# Responses smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+
+# Default and maximum page size for company lists
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Cache of encoded response bodies keyed by request path and query string
+_response_cache = {}
+
+# Function to run a blocking query function in a worker thread
+async def run_query(func, *args, **kwargs):
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+# Function to build a JSON response with ETag, conditional GET and gzip support
+def json_response(request, body):
+    etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={CACHE_TTL}',
+        'Vary': 'Accept-Encoding',
+    }
+
+    # Answer with 304 Not Modified when the client already has this version
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in (tag.strip() for tag in if_none_match.split(',')) or if_none_match.strip() == '*':
+        return web.Response(status=304, headers=headers)
+
+    response = web.Response(body=body, content_type='application/json', headers=headers)
+    if len(body) >= GZIP_MIN_SIZE and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response.enable_compression(web.ContentCoding.gzip)
+    return response
+
+# Function to serve a request from the cache, or compute and cache the payload
+async def cached_json(request, build_payload):
+    key = request.path_qs
+    cached = _response_cache.get(key)
+    if cached is None or time.monotonic() - cached[0] > CACHE_TTL:
+        payload = await build_payload()
+        body = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+        # Drop the oldest entry once the cache is full
+        if len(_response_cache) >= CACHE_MAX_ENTRIES:
+            _response_cache.pop(next(iter(_response_cache)))
+        cached = (time.monotonic(), body)
+        _response_cache[key] = cached
+    return json_response(request, cached[1])
+
+# Function to build a 400 Bad Request error with a JSON body
+def bad_request(message):
+    return web.HTTPBadRequest(text=json.dumps({'error': message}), content_type='application/json')
+
+# Function to build a 404 Not Found error with a JSON body
+def not_found(message):
+    return web.HTTPNotFound(text=json.dumps({'error': message}), content_type='application/json')
+
+# Function to read and validate the sector code from the URL
+def get_sector_code(request):
+    sector_code = request.match_info['sector_code'].upper()
+    if sector_code not in sector_mappings:
+        raise not_found(f"Unknown sector '{sector_code}'")
+    return sector_code
+
+# Function to read and validate the CVR number from the URL
+def get_cvr_number(request):
+    cvr_number = request.match_info['cvr_number']
+    if not cvr_number.isdigit():
+        raise bad_request("CVR number must be numeric")
+    return int(cvr_number)
+
+# Function to read an integer query parameter
+def get_int_param(request, name, default):
+    value = request.query.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise bad_request(f"Query parameter '{name}' must be an integer")
+
+# Function to read the year range from the 'start' and 'end' query parameters
+async def get_year_range_param(request):
+    min_year, max_year = await run_query(get_year_range)
+    return get_int_param(request, 'start', min_year), get_int_param(request, 'end', max_year)
+
+# Functions to encode and decode the opaque keyset pagination cursor
+def encode_cursor(name, cvr_number):
+    return base64.urlsafe_b64encode(json.dumps([name or '', cvr_number]).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        name, cvr_number = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(name), int(cvr_number)
+    except (ValueError, TypeError):
+        raise bad_request("Invalid pagination cursor")
+
+# GET /api/sectors
+async def list_sectors(request):
+    async def build():
+        return [{'code': code, 'name': name} for code, name in sector_mappings.items()]
+    return await cached_json(request, build)
+
+# GET /api/sectors/{sector_code}/trends?start=&end=
+async def sector_trends(request):
+    sector_code = get_sector_code(request)
+
+    async def build():
+        year_range = await get_year_range_param(request)
+        rows = await run_query(fetch_financial_trends, sector_mappings[sector_code], year_range)
+        return [{'year': year, 'average_profit_loss': profit_loss, 'average_equity': equity}
+                for year, profit_loss, equity in rows]
+    return await cached_json(request, build)
+
+# GET /api/sectors/{sector_code}/health?start=&end=
+async def sector_health(request):
+    sector_code = get_sector_code(request)
+
+    async def build():
+        year_range = await get_year_range_param(request)
+        rows = await run_query(fetch_financial_health_indicators, sector_mappings[sector_code], year_range)
+        return [{'year': year, 'average_roa': roa, 'average_roi': roi, 'average_solvency_ratio': solvency_ratio}
+                for year, roa, roi, solvency_ratio in rows]
+    return await cached_json(request, build)
+
+# GET /api/sectors/{sector_code}/hidden-gems?start=&end=
+async def sector_hidden_gems(request):
+    sector_code = get_sector_code(request)
+
+    async def build():
+        year_range = await get_year_range_param(request)
+        rows = await run_query(get_hidden_gems, sector_code, year_range)
+        return [{'name': name, 'cvr': cvr, 'recent_year': year, 'profit_loss': profit_loss,
+                 'equity': equity, 'solvency_ratio': solvency_ratio}
+                for name, cvr, year, profit_loss, equity, solvency_ratio in rows]
+    return await cached_json(request, build)
+
+# GET /api/sectors/{sector_code}/scores
+async def sector_scores(request):
+    sector_code = get_sector_code(request)
+
+    async def build():
+        if not await run_query(features_available):
+            return []
+        rows = await run_query(fetch_company_features, sector_code)
+        columns = ['name', 'cvr', 'latest_year', 'profit_growth', 'equity_growth', 'equity_volatility',
+                   'max_drawdown', 'current_drawdown', 'anomaly_score', 'is_anomaly']
+        return [dict(zip(columns, row)) for row in rows]
+    return await cached_json(request, build)
+
+# GET /api/companies?sector=&after=&limit=
+# GET /api/sectors/{sector_code}/companies?after=&limit=
+async def list_companies(request):
+    if 'sector_code' in request.match_info:
+        sector_code = get_sector_code(request)
+    elif 'sector' in request.query:
+        sector_code = request.query['sector'].upper()
+        if sector_code not in sector_mappings:
+            raise bad_request(f"Unknown sector '{sector_code}'")
+    else:
+        sector_code = None
+    limit = min(max(get_int_param(request, 'limit', DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    after = decode_cursor(request.query['after']) if 'after' in request.query else None
+
+    async def build():
+        # Fetch one extra row to find out whether there is a next page
+        rows = await run_query(fetch_companies_page, sector_code, after, limit + 1)
+        page = rows[:limit]
+        next_cursor = encode_cursor(page[-1][1], page[-1][0]) if len(rows) > limit else None
+        return {
+            'items': [{'cvr': cvr, 'name': name, 'sector': sector} for cvr, name, sector in page],
+            'next': next_cursor,
+        }
+    return await cached_json(request, build)
+
+# GET /api/companies/{cvr_number}
+async def company_info(request):
+    cvr_number = get_cvr_number(request)
+
+    async def build():
+        company_data, financial_data = await run_query(fetch_company_info, cvr_number)
+        if not company_data:
+            raise not_found(f"Unknown company '{cvr_number}'")
+        name, sector, email, phone, establishment_date, purpose = company_data
+        payload = {
+            'cvr': cvr_number, 'name': name, 'sector': sector, 'sector_name': sector_mappings.get(sector),
+            'email': email, 'phone_number': phone, 'establishment_date': establishment_date, 'purpose': purpose,
+            'latest_financials': None,
+        }
+        if financial_data:
+            profit_loss, equity, roa, solvency_ratio = financial_data
+            payload['latest_financials'] = {'profit_loss': profit_loss, 'equity': equity,
+                                            'return_on_assets': roa, 'solvency_ratio': solvency_ratio}
+        return payload
+    return await cached_json(request, build)
+
+# GET /api/companies/{cvr_number}/history?start=&end=
+async def company_history(request):
+    cvr_number = get_cvr_number(request)
+
+    async def build():
+        year_range = await get_year_range_param(request)
+        rows = await run_query(fetch_company_financial_history, cvr_number, year_range)
+        return [{'year': year, 'profit_loss': profit_loss, 'equity': equity, 'return_on_assets': roa}
+                for year, profit_loss, equity, roa in rows]
+    return await cached_json(request, build)
+
+# GET /api/companies/{cvr_number}/sector-comparison?start=&end=
+async def company_sector_comparison(request):
+    cvr_number = get_cvr_number(request)
+
+    async def build():
+        company_data, _ = await run_query(fetch_company_info, cvr_number)
+        if not company_data:
+            raise not_found(f"Unknown company '{cvr_number}'")
+        sector_code = company_data[1]
+        year_range = await get_year_range_param(request)
+        company_rows, sector_rows = await run_query(fetch_sector_comparison, cvr_number, sector_code, year_range)
+        return {
+            'sector': sector_code,
+            'company': [{'year': year, 'profit_loss': profit_loss, 'equity': equity, 'return_on_assets': roa}
+                        for year, profit_loss, equity, roa in company_rows],
+            'sector_average': [{'year': year, 'profit_loss': profit_loss, 'equity': equity, 'return_on_assets': roa}
+                               for year, profit_loss, equity, roa in sector_rows],
+        }
+    return await cached_json(request, build)
+
+# Indexes matching the ordering of the paginated company lists, created with: python api.py --setup-indexes
+API_INDEXES = {
+    'idx_company_name_cvr': "CREATE INDEX IF NOT EXISTS idx_company_name_cvr ON company (IFNULL(name, ''), cvr_number)",
+    'idx_company_sector_name_cvr': "CREATE INDEX IF NOT EXISTS idx_company_sector_name_cvr ON company (industry_sector, IFNULL(name, ''), cvr_number)",
+}
+
+# Function to create the indexes used by the API; a one-off setup step, the API itself never writes
+def setup_api_indexes():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    for statement in API_INDEXES.values():
+        cursor.execute(statement)
+    conn.commit()
+
+# Function to list the API indexes that have not been created yet
+def missing_api_indexes():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='index'")
+    existing = {row[0] for row in cursor.fetchall()}
+    return [name for name in API_INDEXES if name not in existing]
+
+# Function to create the web application with all routes registered
+def create_app():
+    app = web.Application()
+    app.router.add_get('/api/sectors', list_sectors)
+    app.router.add_get('/api/sectors/{sector_code}/trends', sector_trends)
+    app.router.add_get('/api/sectors/{sector_code}/health', sector_health)
+    app.router.add_get('/api/sectors/{sector_code}/hidden-gems', sector_hidden_gems)
+    app.router.add_get('/api/sectors/{sector_code}/scores', sector_scores)
+    app.router.add_get('/api/sectors/{sector_code}/companies', list_companies)
+    app.router.add_get('/api/companies', list_companies)
+    app.router.add_get('/api/companies/{cvr_number}', company_info)
+    app.router.add_get('/api/companies/{cvr_number}/history', company_history)
+    app.router.add_get('/api/companies/{cvr_number}/sector-comparison', company_sector_comparison)
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the dashboard queries as a read-only JSON API.")
+    parser.add_argument('--host', default='127.0.0.1', help="Interface to listen on")
+    parser.add_argument('--port', type=int, default=8080, help="Port to listen on")
+    parser.add_argument('--setup-indexes', action='store_true', help="Create the indexes used for paginating company lists and exit")
+    args = parser.parse_args()
+
+    if args.setup_indexes:
+        setup_api_indexes()
+        print(f"Created indexes: {', '.join(API_INDEXES)}")
+        sys.exit(0)
+
+    # Company lists still work without the indexes, but deep pages get slow
+    missing = missing_api_indexes()
+    if missing:
+        print(f"Warning: missing indexes {', '.join(missing)}; run 'python api.py --setup-indexes' once "
+              f"to keep paginated company lists fast", file=sys.stderr)
+
+    web.run_app(create_app(), host=args.host, port=args.port)
@@ -4,6 +4,7 @@ import bcrypt  # Used for hashing and checking passwords
 import streamlit as st  # Main module for creating web application
 import os  # Provides functions to interact with the operating system
 from styles import apply_custom_css  # Custom function to apply CSS styles
+from watchlist import setup_watchlist_tables  # Function to create the watchlist tables
 
 # Define a dictionary that maps sector codes to their full names
 sector_mappings = {
@@ -51,6 +52,7 @@ def setup_database():
             )
         """)  # Execute a SQL command to create the 'users' table
     conn.commit()  # Commit the changes to the database
+    setup_watchlist_tables()  # Create the tables holding the users' watchlists
 
 def hash_password(password):
     # Hash a password using bcrypt for secure storage
@@ -0,0 +1,29 @@
+# Chart builders shared by the Streamlit dashboard and the report generator
+
+# Import the required libraries and modules
+import plotly.express as px  # Used for creating interactive charts
+import pandas as pd  # Used for data manipulation and analysis
+
+# Function to turn the rows returned by fetch_financial_trends into a DataFrame
+def trends_dataframe(trends_data):
+    return pd.DataFrame(trends_data, columns=['Year', 'Average Profit/Loss', 'Average Equity'])
+
+# Function to turn the rows returned by fetch_financial_health_indicators into a DataFrame
+def health_dataframe(health_data):
+    return pd.DataFrame(health_data, columns=['Year', 'Average ROA', 'Average ROI', 'Average Solvency Ratio'])
+
+# Function to build the financial trends chart from a DataFrame created by trends_dataframe
+def build_trends_figure(trends_df, sector_name):
+    fig = px.line(trends_df, x='Year', y=['Average Profit/Loss', 'Average Equity'], title = f'Financial Trends for {sector_name}', markers=True)
+    fig.update_xaxes(title_text='Year')
+    fig.update_yaxes(title_text='Values in DKK', tickprefix="DKK")
+    fig.update_layout(legend_title_text='Metric')
+    return fig
+
+# Function to build the financial health indicators chart from a DataFrame created by health_dataframe
+def build_health_figure(health_df, sector_name):
+    fig = px.line(health_df, x='Year', y=['Average ROA', 'Average ROI', 'Average Solvency Ratio'], title=f'Financial Health Indicators of {sector_name}', markers=True)
+    fig.update_xaxes(title_text='Year')
+    fig.update_yaxes(title_text='Ratio/Percentage', tickprefix="DKK")
+    fig.update_layout(legend_title_text='Indicator')
+    return fig
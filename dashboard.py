@@ -1,41 +1,18 @@
 # Import the required libraries and modules
 import streamlit as st  # Used for creating the web app interface
-import sqlite3  # Used for SQLite database operations
 import plotly.express as px  # Used for creating interactive charts
 import pandas as pd  # Used for data manipulation and analysis
 from styles import apply_custom_css  # Custom function to apply CSS styling
-import os  # Used for interacting with the file system
-
-# Define a dictionary to map sector codes to their full names for better readability
-sector_mappings = {
-    'A': 'Agriculture, hunting, forestry and fishing',
-    'B': 'Raw material extraction',
-    'C': 'Manufacturing',
-    'D': 'Electricity, gas and district heating supply',
-    'E': 'Water supply; sewage system, waste management and cleaning of soil and groundwater',
-    'F': 'Building and construction business',
-    'G': 'Wholesale and retail trade; repair of motor vehicles and motorcycles',
-    'H': 'Transport and cargo handling',
-    'I': 'Accommodation facilities and restaurant business',
-    'J': 'Information and communication',
-    'K': 'Banking and financial services, insurance',
-    'L': 'Real estate',
-    'M': 'Liberal, scientific and technical services',
-    'N': 'Administrative and support services',
-    'O': 'Public administration and defence; social Security',
-    'P': 'Teaching',
-    'Q': 'Health care and social measures',
-    'R': 'Culture, amusements and sports',
-    'S': 'Other services',
-    'T': 'Private households with hired help; households’ production of goods and services for their own use'
-}
-
-# Function to establish a connection with the SQLite database
-def get_db_connection():
-    # Build the path to the database file using the current file location
-    db_path = os.path.join(os.path.dirname(__file__), 'cvr_database.db')
-    # Connect to the SQLite database and return the connection object
-    return sqlite3.connect(db_path)
+from charts import trends_dataframe, health_dataframe, build_trends_figure, build_health_figure  # Charts shared with the report generator
+from search import search_companies, search_index_available  # Fuzzy company search across all sectors
+from watchlist import add_to_watchlist, remove_from_watchlist, fetch_watchlist, fetch_watchlist_changes, CHANGE_THRESHOLDS  # Per-user watchlists
+from session_memory import begin_view, track, cached, is_admin, session_totals, view_totals, clear_session_cache, SESSION_BUDGET_BYTES, SESSION_CACHE_TTL  # Per-session memory accounting
+from queries import (  # Database queries shared with the HTTP API and batch jobs
+    sector_mappings, get_db_connection, get_sector_choices, get_year_range, fetch_companies_in_sector,
+    fetch_financial_trends, fetch_financial_health_indicators, fetch_company_financial_history,
+    fetch_company_info, fetch_sector_comparison, fetch_financial_data_for_companies, get_hidden_gems,
+    features_available, fetch_company_features,
+)
 
 # Function to set up the database by creating necessary tables if they don't exist
 def setup_database():
@@ -64,126 +41,10 @@ def setup_database():
     # Commit the changes to the database
     conn.commit()
 
-# Function to retrieve a list of sector choices from the sector_mappings dictionary
-def get_sector_choices():
-    # Return the values (sector names) from the sector_mappings dictionary as a list
-    return list(sector_mappings.values())
-
-# Function to get the range of years from the 'financials' table in the database
-def get_year_range():
-    # Establish a connection to the database
-    conn = get_db_connection()
-    # Create a cursor object to execute SQL queries
-    cursor = conn.cursor()
-    # Execute a SQL query to find the minimum and maximum year in the 'financials' table
-    cursor.execute("SELECT MIN(year), MAX(year) FROM financials")
-    # Fetch the result of the query
-    min_year, max_year = cursor.fetchone()
-    # Return the minimum and maximum year
-    return min_year, max_year
-
-# Function to fetch a list of companies in a given sector
-def fetch_companies_in_sector(sector_code):
-    # Establish a connection to the database
-    conn = get_db_connection()
-    # Create a cursor object to execute SQL queries
-    cursor = conn.cursor()
-    # SQL query to select companies from a specific sector, ordered by name
-    query = """
-    SELECT cvr_number, name
-    FROM company
-    WHERE industry_sector = ?
-    ORDER BY name
-    """
-    # Execute the query with the sector_code as a parameter
-    cursor.execute(query, (sector_code,))
-    # Fetch all rows of the query result
-    return cursor.fetchall()
-
-# Function to fetch financial trends for a given sector and year range
-def fetch_financial_trends(sector_name, year_range):
-    # Establish a connection to the database
-    conn = get_db_connection()
-    # Create a cursor object to execute SQL queries
-    cursor = conn.cursor()
-    # Find the sector code corresponding to the sector name
-    sector_code = next(code for code, name in sector_mappings.items() if name == sector_name)
-    # SQL query to select the average profit/loss and equity for each year in the given sector and year range
-    query = """
-    SELECT f.year, AVG(f.profit_loss) AS average_profit_loss, AVG(f.equity) AS average_equity
-    FROM financials f
-    JOIN company c ON f.cvr = c.cvr_number
-    WHERE c.industry_sector = ? AND f.year BETWEEN ? AND ?
-    GROUP BY f.year
-    ORDER BY f.year
-    """
-    # Execute the query with sector_code, start year, and end year as parameters
-    cursor.execute(query, (sector_code, year_range[0], year_range[1]))
-    # Fetch all rows of the query result
-    return cursor.fetchall()
-
-# Function to fetch financial health indicators for a given sector and year range
-def fetch_financial_health_indicators(sector_name, year_range):
-    # Establish a connection to the database
-    conn = get_db_connection()
-    # Create a cursor object to execute SQL queries
-    cursor = conn.cursor()
-    # Find the sector code corresponding to the sector name
-    sector_code = next(code for code, name in sector_mappings.items() if name == sector_name)
-    # SQL query to select average return on assets, return on investment, and solvency ratio for each year in the given sector and year range
-    query = """
-    SELECT 
-        f.year, 
-        AVG(f.return_on_assets) AS average_roa, 
-        AVG(f.return_on_investment) AS average_roi, 
-        AVG(f.solvency_ratio) AS average_solvency_ratio
-    FROM financials f
-    JOIN company c ON f.cvr = c.cvr_number
-    WHERE c.industry_sector = ? AND f.year BETWEEN ? AND ?
-    GROUP BY f.year
-    ORDER BY f.year
-    """
-    # Execute the query with sector_code, start year, and end year as parameters
-    cursor.execute(query, (sector_code, year_range[0], year_range[1]))
-    # Fetch all rows of the query result
-    return cursor.fetchall()
-
-# Function to fetch the financial history of a specific company given its CVR number and a year range
-def fetch_company_financial_history(cvr_number, year_range):
-    # Establish a connection to the database
-    conn = get_db_connection()
-    # Create a cursor object to execute SQL queries
-    cursor = conn.cursor()
-    # SQL query to select year, profit/loss, equity, and return on assets for the given company and year range
-    query = """
-    SELECT year, profit_loss, equity, return_on_assets
-    FROM financials
-    WHERE cvr = ? AND year BETWEEN ? AND ?
-    ORDER BY year
-    """
-    # Combine the CVR number and year range into a single tuple for the query parameters
-    params = (cvr_number,) + year_range
-    # Execute the query with the parameters
-    cursor.execute(query, params)
-    # Fetch all rows of the query result
-    return cursor.fetchall()
-
 # Function to display detailed information for a selected company using its CVR number
 def display_company_info(cvr_number):
-    # Establish a connection to the database
-    conn = get_db_connection()
-    # Create a cursor object to execute SQL queries
-    cursor = conn.cursor()
-    # SQL queries to select basic and financial information for the given company
-    company_query = "SELECT name, industry_sector, email, phone_number, establishment_date, purpose FROM company WHERE cvr_number = ?"
-    financial_query = "SELECT profit_loss, equity, return_on_assets, solvency_ratio FROM financials WHERE cvr = ? ORDER BY year DESC LIMIT 1"
-    
-    # Execute the queries
-    cursor.execute(company_query, (cvr_number,))
-    company_data = cursor.fetchone()
-    
-    cursor.execute(financial_query, (cvr_number,))
-    financial_data = cursor.fetchone()
+    # Fetch the basic and financial information for the given company
+    company_data, financial_data = fetch_company_info(cvr_number)
     
     # Check and display company data if available
     if company_data:
@@ -217,41 +78,17 @@ def display_company_info(cvr_number):
 
 # Function to display a comparison of financial performance between a selected company and its sector
 def display_sector_comparison(cvr_number, sector_code, year_range, company_name, sector_name):
-    # Establish a connection to the database
-    conn = get_db_connection()
-    # Create a cursor object to execute SQL queries
-    cursor = conn.cursor()
-
-    # SQL queries to select financial data for the given company and its sector
-    company_query = """
-    SELECT year, profit_loss, equity, return_on_assets 
-    FROM financials 
-    WHERE cvr = ? AND year BETWEEN ? AND ? 
-    ORDER BY year
-    """
-    sector_query = """
-    SELECT year, AVG(profit_loss) AS avg_profit_loss, AVG(equity) AS avg_equity, AVG(return_on_assets) AS avg_roa 
-    FROM financials f 
-    JOIN company c ON f.cvr = c.cvr_number 
-    WHERE c.industry_sector = ? AND f.year BETWEEN ? AND ? 
-    GROUP BY f.year
-    """
-    
-    # Execute the queries
-    cursor.execute(company_query, (cvr_number, year_range[0], year_range[1]))
-    company_data = cursor.fetchall()
-    
-    cursor.execute(sector_query, (sector_code, year_range[0], year_range[1]))
-    sector_data = cursor.fetchall()
+    # Fetch financial data for the given company and its sector
+    company_data, sector_data = fetch_sector_comparison(cvr_number, sector_code, year_range)
 
     # Check if data is available for both the company and its sector
     if company_data and sector_data:
         # Convert the query results to pandas DataFrames
-        company_df = pd.DataFrame(company_data, columns=['Year', 'Profit/Loss', 'Equity', 'ROA'])
-        sector_df = pd.DataFrame(sector_data, columns=['Year', 'Avg Profit/Loss', 'Avg Equity', 'Avg ROA'])
+        company_df = track(pd.DataFrame(company_data, columns=['Year', 'Profit/Loss', 'Equity', 'ROA']))
+        sector_df = track(pd.DataFrame(sector_data, columns=['Year', 'Avg Profit/Loss', 'Avg Equity', 'Avg ROA']))
 
         # Merge the DataFrames for comparison
-        combined_df = company_df.merge(sector_df, on='Year', suffixes=('', ' Avg'))
+        combined_df = track(company_df.merge(sector_df, on='Year', suffixes=('', ' Avg')))
         
         # Create a line chart comparing the company and sector financials
         fig = px.line(combined_df, x='Year', y=['Profit/Loss', 'Avg Profit/Loss', 'Equity', 'Avg Equity', 'ROA', 'Avg ROA'], 
@@ -262,7 +99,7 @@ def display_sector_comparison(cvr_number, sector_code, year_range, company_name,
         # Set the legend title
         fig.update_layout(legend_title_text='Metric')
         # Display the chart in the Streamlit app
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(track(fig), use_container_width=True)
 
         # Display a detailed explanation of the comparison
         st.markdown(f"""
@@ -316,61 +153,70 @@ def style_hidden_gems_dataframe(df):
     
     return styled
 
-# Function to fetch and display financial data for multi-company comparison
-def fetch_financial_data_for_companies(cvr_numbers, year_range):
-    # Ensure cvr_numbers is a list
-    if not isinstance(cvr_numbers, list):
-        cvr_numbers = [cvr_numbers]
-
-    # Now cvr_numbers is guaranteed to be a list, so we can iterate over it
-    placeholders = ','.join('?' * len(cvr_numbers))  # Create a placeholder for each CVR number
-
-    # Your existing code to fetch data from the database...
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    query = f"""
-    SELECT f.cvr, f.year, f.profit_loss, f.equity, f.return_on_assets
-    FROM financials f
-    INNER JOIN (
-        SELECT cvr, MAX(year) AS recent_year
-        FROM financials
-        WHERE cvr IN ({placeholders}) AND year BETWEEN ? AND ?
-        GROUP BY cvr
-    ) AS recent_f ON f.cvr = recent_f.cvr AND f.year = recent_f.recent_year
-    """
-    params = cvr_numbers + list(year_range)
-    cursor.execute(query, params)
-    return cursor.fetchall()
-
-# Function for finding hidding gems
-def get_hidden_gems(sector_code, year_range):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    query = """
-    SELECT
-        c.name AS 'Company Name',
-        f.cvr AS 'CVR',
-        MAX(f.year) AS 'Recent Year',
-        f.profit_loss AS 'Profit/Loss',
-        f.equity AS 'Equity',
-        f.solvency_ratio AS 'Solvency Ratio'
-    FROM financials f
-    JOIN company c ON f.cvr = c.cvr_number
-    WHERE c.industry_sector = ? AND f.year BETWEEN ? AND ?
-    GROUP BY f.cvr
-    HAVING COUNT(f.year) >= 5 AND f.solvency_ratio > 0.2 AND f.profit_loss < 0
-    ORDER BY f.profit_loss
-    """
-    cursor.execute(query, (sector_code, year_range[0], year_range[1]))
-    return cursor.fetchall()
+def style_features_dataframe(df):
+    # Format the growth, volatility and drawdown columns as percentages
+    percentage_columns = ['Profit Growth', 'Equity Growth', 'Equity Volatility', 'Max Drawdown', 'Current Drawdown']
+    styled = df.style.format({column: "{:.1%}" for column in percentage_columns}).format({'Anomaly Score': "{:.2f}"})
+    # Highlight the companies whose metrics deviate strongly from their sector
+    return styled.apply(lambda row: ['background-color: #ffcc66' if row['Anomaly'] else '' for _ in row], axis=1)
+
+# Callback for the search results: select the company's sector, view and company before the next rerun
+def jump_to_company(company, view):
+    cvr_number, name, sector = company
+    if sector not in sector_mappings:
+        return
+    st.session_state.sector_choice = sector_mappings[sector]
+    st.session_state.view_data = view
+    st.session_state.search_company = (cvr_number, name)  # Preselected by the company dropdown of the view
+    if view == "Company Analysis 🔎":
+        st.session_state.show_company_analysis = True  # Show the financial data without pressing the button
+
+# Function to get the dropdown position of the company chosen in the search, if it is in the list.
+# The choice is kept, so the dropdown keeps the same default (and the user's selection) on later reruns.
+def get_search_company_index(companies):
+    search_company = st.session_state.get('search_company')
+    return companies.index(search_company) if search_company in companies else 0
+
+# Function to display a sidebar button that adds a company to the logged in user's watchlist
+def display_watchlist_button(cvr_number):
+    if st.sidebar.button("Add to Watchlist ⭐", key=f"watch_{cvr_number}"):
+        if add_to_watchlist(st.session_state.username, cvr_number):
+            st.sidebar.success("Added to your watchlist.")
+        else:
+            st.sidebar.info("Already on your watchlist.")
+
+# Function to display the global company search in the sidebar
+def display_company_search():
+    search_query = st.sidebar.text_input("Search Companies", placeholder="Company name or CVR number", key="company_search")
+    if len(search_query.strip()) < 3:
+        return
+    if not search_index_available():
+        st.sidebar.info("The search index has not been built yet. Run `python search.py --rebuild` to enable the search.")
+        return
+
+    results = search_companies(search_query)
+    if results:
+        selected_result = st.sidebar.selectbox("Search Results", results, format_func=lambda x: f"{x[1]} ({x[0]})", key="search_result")
+        # The views list companies per sector, so companies without a known sector cannot be opened there
+        unknown_sector = selected_result[2] not in sector_mappings
+        if unknown_sector:
+            st.sidebar.caption("This company is not registered in a known sector, so it cannot be opened in the views.")
+        col1, col2 = st.sidebar.columns(2)
+        col1.button("Information", on_click=jump_to_company, args=(selected_result, "Company Information 🛈"), disabled=unknown_sector)
+        col2.button("Analysis", on_click=jump_to_company, args=(selected_result, "Company Analysis 🔎"), disabled=unknown_sector)
+    else:
+        st.sidebar.write("No companies found.")
 
 # Main function to run the Streamlit dashboard
 # Main Function for the App
 def run_dashboard():
     apply_custom_css()
+    st.sidebar.header("Search 🔎")
+    display_company_search()
+
     st.sidebar.header("Filters 🔍")
     sectors = get_sector_choices()
-    sector_choice = st.sidebar.selectbox("Select Sector", sectors, format_func=lambda x: sector_mappings.get(x, x))
+    sector_choice = st.sidebar.selectbox("Select Sector", sectors, format_func=lambda x: sector_mappings.get(x, x), key="sector_choice")
 
     min_year, max_year = get_year_range()
     start_year = st.sidebar.text_input("Start Year", value=str(min_year))
@@ -386,18 +232,16 @@ def run_dashboard():
     sector_code = next(code for code, name in sector_mappings.items() if name == sector_choice)  # Convert sector name to code
     
     st.header("Investor Dashboard")
-    view_data = st.sidebar.selectbox("View Data", ["Financial Trends Analysis 📊", "Financial Health Indicators 💪", "Sector Comparison ⚖️", "Company Analysis 🔎", "Multi-Company Comparison 🤝", "Company Information 🛈", "Hidden Gems: Profit Dips & Financial Strength 🌟"])
+    view_data = st.sidebar.selectbox("View Data", ["Financial Trends Analysis 📊", "Financial Health Indicators 💪", "Sector Comparison ⚖️", "Company Analysis 🔎", "Multi-Company Comparison 🤝", "Company Information 🛈", "Hidden Gems: Profit Dips & Financial Strength 🌟", "Trend & Anomaly Scores 📈", "Watchlist 👀"] + (["Memory Usage 🧮"] if is_admin() else []), key="view_data")
+    begin_view(view_data)
 
     if view_data == "Financial Trends Analysis 📊":
         st.header('Financial Trends Analysis')
-        trends_data = fetch_financial_trends(sector_choice, (selected_start_year, selected_end_year))
+        trends_data = cached(('trends', sector_choice, selected_start_year, selected_end_year), lambda: fetch_financial_trends(sector_choice, (selected_start_year, selected_end_year)))
         if trends_data:
-            trends_df = pd.DataFrame(trends_data, columns=['Year', 'Average Profit/Loss', 'Average Equity'])
-            fig = px.line(trends_df, x='Year', y=['Average Profit/Loss', 'Average Equity'], title = f'Financial Trends for {sector_choice}', markers=True)
-            fig.update_xaxes(title_text='Year')
-            fig.update_yaxes(title_text='Values in DKK', tickprefix="DKK")
-            fig.update_layout(legend_title_text='Metric')
-            st.plotly_chart(fig, use_container_width=True)
+            trends_df = track(trends_dataframe(trends_data))
+            fig = build_trends_figure(trends_df, sector_choice)
+            st.plotly_chart(track(fig), use_container_width=True)
             
             # Explanation text
             st.markdown(f"""
@@ -414,14 +258,11 @@ def run_dashboard():
     
     elif view_data == "Financial Health Indicators 💪":
         st.header('Financial Health Indicators')
-        health_data = fetch_financial_health_indicators(sector_choice, (selected_start_year, selected_end_year))
+        health_data = cached(('health', sector_choice, selected_start_year, selected_end_year), lambda: fetch_financial_health_indicators(sector_choice, (selected_start_year, selected_end_year)))
         if health_data:
-            health_df = pd.DataFrame(health_data, columns=['Year', 'Average ROA', 'Average ROI', 'Average Solvency Ratio'])
-            fig = px.line(health_df, x='Year', y=['Average ROA', 'Average ROI', 'Average Solvency Ratio'], title=f'Financial Health Indicators of {sector_choice}', markers=True)
-            fig.update_xaxes(title_text='Year')
-            fig.update_yaxes(title_text='Ratio/Percentage', tickprefix="DKK")
-            fig.update_layout(legend_title_text='Indicator')
-            st.plotly_chart(fig, use_container_width=True)
+            health_df = track(health_dataframe(health_data))
+            fig = build_health_figure(health_df, sector_choice)
+            st.plotly_chart(track(fig), use_container_width=True)
             
             st.markdown(f"""
             The graph above presents the financial health indicators for the {sector_choice} sector over the selected period from {selected_start_year} to {selected_end_year}. These indicators provide insights into the sector's financial stability and performance. 
@@ -437,7 +278,7 @@ def run_dashboard():
                 
     elif view_data == "Sector Comparison ⚖️":
         st.header('Sector Comparison')
-        companies = fetch_companies_in_sector(sector_code)
+        companies = cached(('companies', sector_code), lambda: fetch_companies_in_sector(sector_code))
         if companies:
             selected_company_tuple = st.sidebar.selectbox("Select a Company for Comparison", companies, format_func=lambda x: x[1])
             cvr_number = selected_company_tuple[0]
@@ -451,27 +292,28 @@ def run_dashboard():
             
     elif view_data == "Company Analysis 🔎":
         st.header('Company Analysis')
-        companies = fetch_companies_in_sector(sector_code)
+        companies = cached(('companies', sector_code), lambda: fetch_companies_in_sector(sector_code))
         if companies:
-            selected_company = st.sidebar.selectbox("Select a Company for Analysis", companies, format_func=lambda x: x[1])
+            selected_company = st.sidebar.selectbox("Select a Company for Analysis", companies, index=get_search_company_index(companies), format_func=lambda x: x[1], key="company_analysis")
             cvr_number = selected_company[0]  # Get the CVR number of the selected company
+            display_watchlist_button(cvr_number)
             
-            if st.sidebar.button('Show Financial Data'):
+            if st.sidebar.button('Show Financial Data') or st.session_state.pop('show_company_analysis', False):
                 company_data = fetch_company_financial_history(cvr_number, (selected_start_year, selected_end_year))
                 if company_data:
-                    df = pd.DataFrame(company_data, columns=['Year', 'Profit/Loss (DKK)', 'Equity', 'ROA'])
+                    df = track(pd.DataFrame(company_data, columns=['Year', 'Profit/Loss (DKK)', 'Equity', 'ROA']))
                     
                     # Profit/Loss Chart
                     profit_loss_fig = px.line(df, x='Year', y='Profit/Loss (DKK)', title=f'Profit/Loss of {selected_company[1]}')
-                    st.plotly_chart(profit_loss_fig, use_container_width=True)
+                    st.plotly_chart(track(profit_loss_fig), use_container_width=True)
 
                     # Equity Chart
                     equity_fig = px.line(df, x='Year', y='Equity', title=f'Equity of {selected_company[1]}')
-                    st.plotly_chart(equity_fig, use_container_width=True)
+                    st.plotly_chart(track(equity_fig), use_container_width=True)
 
                     # ROA Chart
                     roa_fig = px.line(df, x='Year', y='ROA', title=f'Return on Assets (ROA) of {selected_company[1]}')
-                    st.plotly_chart(roa_fig, use_container_width=True)
+                    st.plotly_chart(track(roa_fig), use_container_width=True)
                     
                     # Detailed explanation text
                     st.markdown(f"""
@@ -488,7 +330,7 @@ def run_dashboard():
                 
     elif view_data == "Multi-Company Comparison 🤝":
         st.header('Multi-Company Comparison')
-        companies = fetch_companies_in_sector(sector_code)
+        companies = cached(('companies', sector_code), lambda: fetch_companies_in_sector(sector_code))
         if companies:
             company_options = [(cvr, name) for cvr, name in companies]
             selected_companies = st.multiselect("Select companies for comparison", company_options, format_func=lambda x: x[1])
@@ -501,9 +343,9 @@ def run_dashboard():
                         comparison_data.append((company_name,) + data)
 
                 if comparison_data:
-                    df = pd.DataFrame(comparison_data, columns=['Company', 'CVR', 'Year', 'Profit/Loss (DKK)', 'Equity', 'ROA'])
+                    df = track(pd.DataFrame(comparison_data, columns=['Company', 'CVR', 'Year', 'Profit/Loss (DKK)', 'Equity', 'ROA']))
                     
-                    styled_df = style_dataframe(df)
+                    styled_df = track(style_dataframe(df))
                     st.dataframe(styled_df)
                     
                     st.markdown("""
@@ -519,11 +361,12 @@ def run_dashboard():
                
     elif view_data == "Company Information 🛈":
         st.header("Company Information")
-        companies = fetch_companies_in_sector(sector_code)
+        companies = cached(('companies', sector_code), lambda: fetch_companies_in_sector(sector_code))
         if companies:
             company_options = [(cvr, name) for cvr, name in companies]
-            selected_company = st.sidebar.selectbox("Select a company", company_options, format_func=lambda x: x[1], key="company_info")
+            selected_company = st.sidebar.selectbox("Select a company", company_options, index=get_search_company_index(company_options), format_func=lambda x: x[1], key="company_info")
             selected_cvr = selected_company[0]  # Assuming selected_company is a tuple (cvr_number, company_name)
+            display_watchlist_button(selected_cvr)
 
             display_company_info(selected_cvr)
         else:
@@ -546,12 +389,97 @@ def run_dashboard():
         Below are the hidden gems from the "{sector_choice}" sector, showcasing strong equity and solvency yet recent profit dips.
         """)
     
-        hidden_gems_data = get_hidden_gems(sector_code, (selected_start_year, selected_end_year))
-        hidden_gems_df = pd.DataFrame(hidden_gems_data, columns=['Company Name', 'CVR', 'Recent Year', 'Profit/Loss', 'Equity', 'Solvency Ratio'])
+        hidden_gems_data = cached(('hidden_gems', sector_code, selected_start_year, selected_end_year), lambda: get_hidden_gems(sector_code, (selected_start_year, selected_end_year)))
+        hidden_gems_df = track(pd.DataFrame(hidden_gems_data, columns=['Company Name', 'CVR', 'Recent Year', 'Profit/Loss', 'Equity', 'Solvency Ratio']))
 
         if not hidden_gems_df.empty:
-            styled_hidden_gems_df = style_hidden_gems_dataframe(hidden_gems_df)
+            styled_hidden_gems_df = track(style_hidden_gems_dataframe(hidden_gems_df))
             st.dataframe(styled_hidden_gems_df)
         else:
             st.write(f"No hidden gems found in the {sector_choice} sector during the specified time frame.")
 
+    elif view_data == "Trend & Anomaly Scores 📈":
+        st.header("Trend & Anomaly Scores")
+        if not features_available():
+            st.info("Trend and anomaly scores have not been computed yet. Run `python analytics.py` to generate them.")
+            return
+
+        st.markdown(f"""
+        **Trend & Anomaly Scores in {sector_choice}**
+
+        Scores are computed per company from its full financial history by the analytics batch job:
+
+        - **Profit/Equity Growth:** Average year-over-year growth over the last three reported years. Yearly growth is capped at ±1000%, since growth from values close to zero is not meaningful.
+        - **Equity Volatility:** How much equity growth fluctuates from year to year.
+        - **Max/Current Drawdown:** Largest and current fall in equity from its previous peak.
+        - **Anomaly Score:** Largest deviation (in standard deviations) of profit, ROA or solvency from the sector in the same year.
+        """)
+
+        features_data = cached(('features', sector_code), lambda: fetch_company_features(sector_code))
+        features_df = track(pd.DataFrame(features_data, columns=['Company Name', 'CVR', 'Latest Year', 'Profit Growth', 'Equity Growth', 'Equity Volatility', 'Max Drawdown', 'Current Drawdown', 'Anomaly Score', 'Anomaly']))
+
+        if not features_df.empty:
+            sort_column = st.sidebar.selectbox("Sort by", ['Anomaly Score', 'Profit Growth', 'Equity Growth', 'Equity Volatility', 'Max Drawdown', 'Current Drawdown'])
+            sort_ascending = st.sidebar.checkbox("Ascending order", value=sort_column in ('Max Drawdown', 'Current Drawdown'))
+            min_score = st.sidebar.number_input("Minimum anomaly score", min_value=0.0, value=0.0, step=0.5)
+            only_anomalies = st.sidebar.checkbox("Only show anomalies")
+
+            features_df = features_df[features_df['Anomaly Score'].fillna(0) >= min_score]
+            if only_anomalies:
+                features_df = features_df[features_df['Anomaly'] == 1]
+            features_df = features_df.sort_values(sort_column, ascending=sort_ascending, na_position='last')
+            features_df['Anomaly'] = features_df['Anomaly'].astype(bool)
+
+            st.dataframe(track(style_features_dataframe(features_df)), hide_index=True)
+        else:
+            st.write(f"No trend and anomaly scores found for the {sector_choice} sector.")
+
+    elif view_data == "Watchlist 👀":
+        st.header("Watchlist")
+        watchlist_data = fetch_watchlist(st.session_state.username)
+        if watchlist_data:
+            # Rows come as (cvr, name, sector, added_at); show the company name first
+            watchlist_df = track(pd.DataFrame(watchlist_data, columns=['CVR', 'Company Name', 'Sector', 'Added'])[['Company Name', 'CVR', 'Sector', 'Added']])
+            watchlist_df['Sector'] = watchlist_df['Sector'].map(lambda code: sector_mappings.get(code, 'Unknown Sector'))
+            st.dataframe(watchlist_df, hide_index=True)
+
+            to_remove = st.multiselect("Remove companies from your watchlist", watchlist_data, format_func=lambda x: x[1] or str(x[0]))
+            if st.button("Remove Selected") and to_remove:
+                remove_from_watchlist(st.session_state.username, [company[0] for company in to_remove])
+                st.rerun()
+
+            st.subheader("Recent Changes")
+            st.markdown(f"""
+            Changes in the most recent financials of your watched companies, as found by the change detection job. Only changes beyond these thresholds are listed: Profit/Loss by more than {CHANGE_THRESHOLDS['profit_loss'][1]:.0%}, Equity by more than {CHANGE_THRESHOLDS['equity'][1]:.0%}, Return on Assets by more than {CHANGE_THRESHOLDS['return_on_assets'][1] * 100:g} points and Solvency Ratio by more than {CHANGE_THRESHOLDS['solvency_ratio'][1] * 100:g} points.
+            """)
+            changes_data = fetch_watchlist_changes(st.session_state.username)
+            if changes_data:
+                changes_df = track(pd.DataFrame(changes_data, columns=['Detected', 'Company Name', 'CVR', 'Year', 'Metric', 'Previous Value', 'New Value']))
+                changes_df['Metric'] = changes_df['Metric'].map({'profit_loss': 'Profit/Loss', 'equity': 'Equity', 'return_on_assets': 'Return on Assets', 'solvency_ratio': 'Solvency Ratio'})
+                st.dataframe(changes_df, hide_index=True)
+            else:
+                st.write("No changes detected for your watched companies yet.")
+        else:
+            st.write("Your watchlist is empty. Use the 'Add to Watchlist ⭐' button in Company Information or Company Analysis to watch a company.")
+
+    elif view_data == "Memory Usage 🧮":
+        st.header("Memory Usage")
+        st.markdown(f"""
+        Approximate memory held by the DataFrames, styled tables, figures and cached query results of every active session in this server process.
+        Cached results of a session are evicted, largest first, once they exceed the budget of **{SESSION_BUDGET_BYTES / 1024 / 1024:,.0f} MB** per session, and fetched again once they are older than **{SESSION_CACHE_TTL / 60:g} minutes**.
+        """)
+
+        sessions_df = pd.DataFrame(session_totals(), columns=['Session', 'User', 'Current View', 'View Bytes', 'Cache Bytes', 'Cached Objects', 'Total Bytes', 'Last Seen'])
+        views_df = pd.DataFrame(view_totals(), columns=['View', 'Sessions', 'Total Bytes', 'Largest Session Bytes'])
+
+        col1, col2 = st.columns(2)
+        col1.metric("Active Sessions", len(sessions_df))
+        col2.metric("Total Tracked Memory", f"{sessions_df['Total Bytes'].sum() / 1024 / 1024:,.1f} MB")
+
+        st.subheader("Per Session")
+        st.dataframe(sessions_df.sort_values('Total Bytes', ascending=False), hide_index=True)
+        st.subheader("Per View")
+        st.dataframe(views_df.sort_values('Total Bytes', ascending=False), hide_index=True)
+
+        if st.button("Clear My Cached Results"):
+            clear_session_cache()
@@ -0,0 +1,289 @@
+# Query layer shared by the Streamlit dashboard, the HTTP API and the batch jobs.
+# Functions in this module only read from the database and return plain rows, so
+# they can be used without a running Streamlit session.
+
+# Import the required libraries and modules
+import sqlite3  # Used for SQLite database operations
+import os  # Used for interacting with the file system
+
+# Define a dictionary to map sector codes to their full names for better readability
+sector_mappings = {
+    'A': 'Agriculture, hunting, forestry and fishing',
+    'B': 'Raw material extraction',
+    'C': 'Manufacturing',
+    'D': 'Electricity, gas and district heating supply',
+    'E': 'Water supply; sewage system, waste management and cleaning of soil and groundwater',
+    'F': 'Building and construction business',
+    'G': 'Wholesale and retail trade; repair of motor vehicles and motorcycles',
+    'H': 'Transport and cargo handling',
+    'I': 'Accommodation facilities and restaurant business',
+    'J': 'Information and communication',
+    'K': 'Banking and financial services, insurance',
+    'L': 'Real estate',
+    'M': 'Liberal, scientific and technical services',
+    'N': 'Administrative and support services',
+    'O': 'Public administration and defence; social Security',
+    'P': 'Teaching',
+    'Q': 'Health care and social measures',
+    'R': 'Culture, amusements and sports',
+    'S': 'Other services',
+    'T': 'Private households with hired help; households’ production of goods and services for their own use'
+}
+
+# Function to establish a connection with the SQLite database
+def get_db_connection():
+    # Build the path to the database file using the current file location
+    db_path = os.path.join(os.path.dirname(__file__), 'cvr_database.db')
+    # Connect to the SQLite database and return the connection object
+    return sqlite3.connect(db_path)
+
+# Function to retrieve a list of sector choices from the sector_mappings dictionary
+def get_sector_choices():
+    # Return the values (sector names) from the sector_mappings dictionary as a list
+    return list(sector_mappings.values())
+
+# Function to get the range of years from the 'financials' table in the database
+def get_year_range():
+    # Establish a connection to the database
+    conn = get_db_connection()
+    # Create a cursor object to execute SQL queries
+    cursor = conn.cursor()
+    # Execute a SQL query to find the minimum and maximum year in the 'financials' table
+    cursor.execute("SELECT MIN(year), MAX(year) FROM financials")
+    # Fetch the result of the query
+    min_year, max_year = cursor.fetchone()
+    # Return the minimum and maximum year
+    return min_year, max_year
+
+# Function to fetch a list of companies in a given sector
+def fetch_companies_in_sector(sector_code):
+    # Establish a connection to the database
+    conn = get_db_connection()
+    # Create a cursor object to execute SQL queries
+    cursor = conn.cursor()
+    # SQL query to select companies from a specific sector, ordered by name
+    query = """
+    SELECT cvr_number, name
+    FROM company
+    WHERE industry_sector = ?
+    ORDER BY name
+    """
+    # Execute the query with the sector_code as a parameter
+    cursor.execute(query, (sector_code,))
+    # Fetch all rows of the query result
+    return cursor.fetchall()
+
+# Function to fetch one page of companies ordered by name, continuing after the given (name, cvr) key.
+# Keyset pagination keeps every page equally cheap, no matter how deep into the list it is,
+# as long as the indexes created by 'python api.py --setup-indexes' exist.
+def fetch_companies_page(sector_code=None, after=None, limit=100):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    conditions = []
+    params = []
+    if sector_code is not None:
+        conditions.append("industry_sector = ?")
+        params.append(sector_code)
+    if after is not None:
+        # The plain bound on the name lets SQLite seek straight to the page in the index
+        conditions.append("IFNULL(name, '') >= ? AND (IFNULL(name, ''), cvr_number) > (?, ?)")
+        params.extend([after[0], after[0], after[1]])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""
+    SELECT cvr_number, name, industry_sector
+    FROM company
+    {where}
+    ORDER BY IFNULL(name, ''), cvr_number
+    LIMIT ?
+    """
+    cursor.execute(query, params + [limit])
+    return cursor.fetchall()
+
+# Function to fetch financial trends for a given sector and year range
+def fetch_financial_trends(sector_name, year_range):
+    # Establish a connection to the database
+    conn = get_db_connection()
+    # Create a cursor object to execute SQL queries
+    cursor = conn.cursor()
+    # Find the sector code corresponding to the sector name
+    sector_code = next(code for code, name in sector_mappings.items() if name == sector_name)
+    # SQL query to select the average profit/loss and equity for each year in the given sector and year range
+    query = """
+    SELECT f.year, AVG(f.profit_loss) AS average_profit_loss, AVG(f.equity) AS average_equity
+    FROM financials f
+    JOIN company c ON f.cvr = c.cvr_number
+    WHERE c.industry_sector = ? AND f.year BETWEEN ? AND ?
+    GROUP BY f.year
+    ORDER BY f.year
+    """
+    # Execute the query with sector_code, start year, and end year as parameters
+    cursor.execute(query, (sector_code, year_range[0], year_range[1]))
+    # Fetch all rows of the query result
+    return cursor.fetchall()
+
+# Function to fetch financial health indicators for a given sector and year range
+def fetch_financial_health_indicators(sector_name, year_range):
+    # Establish a connection to the database
+    conn = get_db_connection()
+    # Create a cursor object to execute SQL queries
+    cursor = conn.cursor()
+    # Find the sector code corresponding to the sector name
+    sector_code = next(code for code, name in sector_mappings.items() if name == sector_name)
+    # SQL query to select average return on assets, return on investment, and solvency ratio for each year in the given sector and year range
+    query = """
+    SELECT 
+        f.year, 
+        AVG(f.return_on_assets) AS average_roa, 
+        AVG(f.return_on_investment) AS average_roi, 
+        AVG(f.solvency_ratio) AS average_solvency_ratio
+    FROM financials f
+    JOIN company c ON f.cvr = c.cvr_number
+    WHERE c.industry_sector = ? AND f.year BETWEEN ? AND ?
+    GROUP BY f.year
+    ORDER BY f.year
+    """
+    # Execute the query with sector_code, start year, and end year as parameters
+    cursor.execute(query, (sector_code, year_range[0], year_range[1]))
+    # Fetch all rows of the query result
+    return cursor.fetchall()
+
+# Function to fetch the financial history of a specific company given its CVR number and a year range
+def fetch_company_financial_history(cvr_number, year_range):
+    # Establish a connection to the database
+    conn = get_db_connection()
+    # Create a cursor object to execute SQL queries
+    cursor = conn.cursor()
+    # SQL query to select year, profit/loss, equity, and return on assets for the given company and year range
+    query = """
+    SELECT year, profit_loss, equity, return_on_assets
+    FROM financials
+    WHERE cvr = ? AND year BETWEEN ? AND ?
+    ORDER BY year
+    """
+    # Combine the CVR number and year range into a single tuple for the query parameters
+    params = (cvr_number,) + year_range
+    # Execute the query with the parameters
+    cursor.execute(query, params)
+    # Fetch all rows of the query result
+    return cursor.fetchall()
+
+# Function to fetch the basic information and most recent financials of a company given its CVR number
+def fetch_company_info(cvr_number):
+    # Establish a connection to the database
+    conn = get_db_connection()
+    # Create a cursor object to execute SQL queries
+    cursor = conn.cursor()
+    # SQL queries to select basic and financial information for the given company
+    company_query = "SELECT name, industry_sector, email, phone_number, establishment_date, purpose FROM company WHERE cvr_number = ?"
+    financial_query = "SELECT profit_loss, equity, return_on_assets, solvency_ratio FROM financials WHERE cvr = ? ORDER BY year DESC LIMIT 1"
+
+    # Execute the queries
+    cursor.execute(company_query, (cvr_number,))
+    company_data = cursor.fetchone()
+
+    cursor.execute(financial_query, (cvr_number,))
+    financial_data = cursor.fetchone()
+
+    # Return both results; either may be None if the company or its financials are missing
+    return company_data, financial_data
+
+# Function to fetch the financial data of a company and the averages of its sector for comparison
+def fetch_sector_comparison(cvr_number, sector_code, year_range):
+    # Establish a connection to the database
+    conn = get_db_connection()
+    # Create a cursor object to execute SQL queries
+    cursor = conn.cursor()
+
+    # SQL queries to select financial data for the given company and its sector
+    company_query = """
+    SELECT year, profit_loss, equity, return_on_assets 
+    FROM financials 
+    WHERE cvr = ? AND year BETWEEN ? AND ? 
+    ORDER BY year
+    """
+    sector_query = """
+    SELECT year, AVG(profit_loss) AS avg_profit_loss, AVG(equity) AS avg_equity, AVG(return_on_assets) AS avg_roa 
+    FROM financials f 
+    JOIN company c ON f.cvr = c.cvr_number 
+    WHERE c.industry_sector = ? AND f.year BETWEEN ? AND ? 
+    GROUP BY f.year
+    """
+
+    # Execute the queries
+    cursor.execute(company_query, (cvr_number, year_range[0], year_range[1]))
+    company_data = cursor.fetchall()
+
+    cursor.execute(sector_query, (sector_code, year_range[0], year_range[1]))
+    sector_data = cursor.fetchall()
+
+    return company_data, sector_data
+
+# Function to fetch and display financial data for multi-company comparison
+def fetch_financial_data_for_companies(cvr_numbers, year_range):
+    # Ensure cvr_numbers is a list
+    if not isinstance(cvr_numbers, list):
+        cvr_numbers = [cvr_numbers]
+
+    # Now cvr_numbers is guaranteed to be a list, so we can iterate over it
+    placeholders = ','.join('?' * len(cvr_numbers))  # Create a placeholder for each CVR number
+
+    # Your existing code to fetch data from the database...
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    query = f"""
+    SELECT f.cvr, f.year, f.profit_loss, f.equity, f.return_on_assets
+    FROM financials f
+    INNER JOIN (
+        SELECT cvr, MAX(year) AS recent_year
+        FROM financials
+        WHERE cvr IN ({placeholders}) AND year BETWEEN ? AND ?
+        GROUP BY cvr
+    ) AS recent_f ON f.cvr = recent_f.cvr AND f.year = recent_f.recent_year
+    """
+    params = cvr_numbers + list(year_range)
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+# Function for finding hidding gems
+def get_hidden_gems(sector_code, year_range):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    query = """
+    SELECT
+        c.name AS 'Company Name',
+        f.cvr AS 'CVR',
+        MAX(f.year) AS 'Recent Year',
+        f.profit_loss AS 'Profit/Loss',
+        f.equity AS 'Equity',
+        f.solvency_ratio AS 'Solvency Ratio'
+    FROM financials f
+    JOIN company c ON f.cvr = c.cvr_number
+    WHERE c.industry_sector = ? AND f.year BETWEEN ? AND ?
+    GROUP BY f.cvr
+    HAVING COUNT(f.year) >= 5 AND f.solvency_ratio > 0.2 AND f.profit_loss < 0
+    ORDER BY f.profit_loss
+    """
+    cursor.execute(query, (sector_code, year_range[0], year_range[1]))
+    return cursor.fetchall()
+
+# Function to check whether the trend and anomaly features have been computed by the batch job
+def features_available():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='company_features'")
+    return cursor.fetchone() is not None
+
+# Function to fetch the precomputed trend and anomaly features for the companies in a sector
+def fetch_company_features(sector_code):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    query = """
+    SELECT
+        c.name, cf.cvr, cf.latest_year, cf.profit_growth, cf.equity_growth, cf.equity_volatility,
+        cf.max_drawdown, cf.current_drawdown, cf.anomaly_score, cf.is_anomaly
+    FROM company_features cf
+    JOIN company c ON cf.cvr = c.cvr_number
+    WHERE cf.industry_sector = ?
+    """
+    cursor.execute(query, (sector_code,))
+    return cursor.fetchall()
@@ -0,0 +1,276 @@
+# Headless report generator for investors.
+# Renders static HTML reports with embedded charts, plus CSV files, per sector or per list of
+# companies (a watchlist). Reports are rendered in parallel on a process pool, and a report is
+# only rendered again when the data it is built from has changed since the previous run.
+#
+# Examples:
+#   python reports.py                                  # all sectors, once
+#   python reports.py --sector C --sector J --force    # selected sectors, ignoring the previous run
+#   python reports.py --watchlist shipping=12345678,87654321
+#   python reports.py --user-watchlists                # one report per user's stored watchlist
+#   python reports.py --every weekly                   # keep running and regenerate every week
+
+# Import the required libraries and modules
+import argparse  # Used for parsing command line options
+import hashlib  # Used for fingerprinting the report input data
+import html  # Used for escaping text in the HTML reports
+import json  # Used for reading and writing the manifest of rendered reports
+import os  # Used for interacting with the file system
+import re  # Used for turning report names into directory names
+import sys  # Used for reporting failed scheduled runs
+import time  # Used for the local scheduler
+from concurrent.futures import ProcessPoolExecutor  # Used for rendering reports in parallel
+from datetime import datetime  # Used for timestamping reports
+import pandas as pd  # Used for building the report tables and CSV files
+import plotly.express as px  # Used for creating charts
+from charts import trends_dataframe, health_dataframe, build_trends_figure, build_health_figure  # Charts shared with the dashboard
+from watchlist import fetch_all_watchlists  # Watchlists stored per user
+from queries import (  # Database queries shared with the dashboard
+    sector_mappings, get_year_range, fetch_financial_trends, fetch_financial_health_indicators,
+    get_hidden_gems, fetch_financial_data_for_companies, fetch_company_financial_history, fetch_company_info,
+)
+
+# Directory the reports and the manifest are written to
+REPORTS_DIR = os.path.join(os.path.dirname(__file__), 'reports')
+MANIFEST_FILE = 'manifest.json'
+
+# Bump this when the report layout changes, so every report is rendered again
+REPORT_VERSION = 1
+
+# Prefix of the report names of the watchlists stored per user
+USER_WATCHLIST_PREFIX = 'user:'
+
+# Seconds between scheduled runs
+SCHEDULE_INTERVALS = {
+    'daily': 24 * 60 * 60,
+    'weekly': 7 * 24 * 60 * 60,
+}
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ color: #333; font-family: 'Helvetica Neue', Arial, sans-serif; margin: 2em auto; max-width: 1100px; }}
+h1 {{ color: #2E3D49; }}
+table {{ border-collapse: collapse; font-size: 0.9em; }}
+th, td {{ border: 1px solid #ddd; padding: 4px 8px; text-align: right; }}
+th {{ background-color: #4F8BF9; color: #ffffff; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+<p>Generated {generated} for {start_year}&ndash;{end_year}. Data: {csv_links}</p>
+{sections}
+</body>
+</html>
+"""
+
+# Function to turn a report name into a safe directory name
+def report_slug(name):
+    return re.sub(r'[^A-Za-z0-9_-]+', '-', name).strip('-').lower()
+
+# Function to build the directory name of a watchlist report. Different names can share a slug
+# (e.g. 'Søren' and 'Sören'), so a short hash of the full name keeps their reports apart.
+def watchlist_report_name(name):
+    return f"watchlist-{report_slug(name)}-{hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]}"
+
+# Function to compute a fingerprint of the data a report is built from
+def fingerprint(inputs):
+    encoded = json.dumps([REPORT_VERSION, inputs], sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+# Function to load the fingerprints of the previously rendered reports
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+# Function to save the fingerprints of the rendered reports
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+# Function to write a report directory with its HTML page and CSV files
+def write_report(report_dir, title, year_range, figures, tables):
+    os.makedirs(report_dir, exist_ok=True)
+    for file_name, df in tables.items():
+        df.to_csv(os.path.join(report_dir, file_name), index=False)
+
+    sections = []
+    for i, (heading, fig) in enumerate(figures):
+        # Embed plotly.js once, so the report also works offline
+        chart = fig.to_html(full_html=False, include_plotlyjs=(i == 0))
+        sections.append(f"<h2>{html.escape(heading)}</h2>\n{chart}")
+    for file_name, df in tables.items():
+        heading = file_name.rsplit('.', 1)[0].replace('_', ' ').title()
+        table = df.to_html(index=False, float_format=lambda value: f"{value:,.2f}", na_rep='', border=0) if not df.empty else "<p>No data available.</p>"
+        sections.append(f"<h2>{html.escape(heading)}</h2>\n{table}")
+
+    csv_links = ', '.join(f'<a href="{file_name}">{file_name}</a>' for file_name in tables)
+    page = HTML_TEMPLATE.format(
+        title=html.escape(title), generated=datetime.now().strftime('%Y-%m-%d %H:%M'),
+        start_year=year_range[0], end_year=year_range[1], csv_links=csv_links, sections='\n'.join(sections),
+    )
+    with open(os.path.join(report_dir, 'report.html'), 'w', encoding='utf-8') as f:
+        f.write(page)
+
+# Function to render the report of one sector, unless its input data is unchanged
+def render_sector_report(sector_code, year_range, output_dir, previous_fingerprint=None):
+    sector_name = sector_mappings[sector_code]
+    report_name = f"sector-{sector_code}"
+    report_dir = os.path.join(output_dir, report_name)
+
+    trends_data = fetch_financial_trends(sector_name, year_range)
+    health_data = fetch_financial_health_indicators(sector_name, year_range)
+    hidden_gems_data = get_hidden_gems(sector_code, year_range)
+    current_fingerprint = fingerprint([year_range, trends_data, health_data, hidden_gems_data])
+    if current_fingerprint == previous_fingerprint and os.path.exists(os.path.join(report_dir, 'report.html')):
+        return report_name, current_fingerprint, False
+
+    trends_df = trends_dataframe(trends_data)
+    health_df = health_dataframe(health_data)
+    figures = []
+    if trends_data:
+        figures.append(('Financial Trends', build_trends_figure(trends_df, sector_name)))
+    if health_data:
+        figures.append(('Financial Health Indicators', build_health_figure(health_df, sector_name)))
+    tables = {
+        'trends.csv': trends_df,
+        'health_indicators.csv': health_df,
+        'hidden_gems.csv': pd.DataFrame(hidden_gems_data, columns=['Company Name', 'CVR', 'Recent Year', 'Profit/Loss', 'Equity', 'Solvency Ratio']),
+    }
+    write_report(report_dir, f"{sector_name} Sector Report", year_range, figures, tables)
+    return report_name, current_fingerprint, True
+
+# Function to render the report of a list of companies, unless its input data is unchanged
+def render_watchlist_report(name, cvr_numbers, year_range, output_dir, previous_fingerprint=None):
+    report_name = watchlist_report_name(name)
+    report_dir = os.path.join(output_dir, report_name)
+
+    company_names = {}
+    history_rows = []
+    for cvr_number in cvr_numbers:
+        company_data, _ = fetch_company_info(cvr_number)
+        company_names[cvr_number] = company_data[0] if company_data else str(cvr_number)
+        history_rows += [(company_names[cvr_number], cvr_number) + row for row in fetch_company_financial_history(cvr_number, year_range)]
+    latest_rows = fetch_financial_data_for_companies(list(cvr_numbers), year_range) if cvr_numbers else []
+    current_fingerprint = fingerprint([year_range, sorted(company_names.items()), history_rows, sorted(latest_rows)])
+    if current_fingerprint == previous_fingerprint and os.path.exists(os.path.join(report_dir, 'report.html')):
+        return report_name, current_fingerprint, False
+
+    history_df = pd.DataFrame(history_rows, columns=['Company', 'CVR', 'Year', 'Profit/Loss (DKK)', 'Equity', 'ROA'])
+    latest_df = pd.DataFrame(latest_rows, columns=['CVR', 'Year', 'Profit/Loss (DKK)', 'Equity', 'ROA'])
+    latest_df.insert(0, 'Company', latest_df['CVR'].map(company_names))
+
+    figures = []
+    if not history_df.empty:
+        for metric in ['Profit/Loss (DKK)', 'Equity', 'ROA']:
+            fig = px.line(history_df, x='Year', y=metric, color='Company', title=f'{metric} of {name}', markers=True)
+            figures.append((metric, fig))
+    tables = {
+        'latest_financials.csv': latest_df,
+        'financial_history.csv': history_df,
+    }
+    write_report(report_dir, f"{name} Watchlist Report", year_range, figures, tables)
+    return report_name, current_fingerprint, True
+
+# Function to render all requested reports in parallel and record which ones were rendered
+def generate_reports(sector_codes=None, watchlists=None, year_range=None, output_dir=REPORTS_DIR, max_workers=None, force=False, user_watchlists=False):
+    sector_codes = list(sector_mappings) if sector_codes is None else sector_codes
+    watchlists = dict(watchlists or {})
+    # Stored watchlists are read on every run, so scheduled runs pick up their changes
+    if user_watchlists:
+        for username, cvr_numbers in fetch_all_watchlists().items():
+            # Prefixed, so stored watchlists cannot share a name with the ones given by name
+            name = f"{USER_WATCHLIST_PREFIX}{username}"
+            # Never let one report silently replace another with the same name
+            if name in watchlists:
+                raise ValueError(f"Watchlist '{name}' is both requested by name and stored for a user")
+            watchlists[name] = cvr_numbers
+    year_range = tuple(year_range or get_year_range())
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    # Without previous fingerprints every requested report is rendered again
+    previous = {} if force else manifest
+
+    rendered, skipped = [], []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(render_sector_report, sector_code, year_range, output_dir, previous.get(f"sector-{sector_code}"))
+            for sector_code in sector_codes
+        ]
+        futures += [
+            executor.submit(render_watchlist_report, name, cvr_numbers, year_range, output_dir, previous.get(watchlist_report_name(name)))
+            for name, cvr_numbers in watchlists.items()
+        ]
+        for future in futures:
+            report_name, report_fingerprint, was_rendered = future.result()
+            manifest[report_name] = report_fingerprint
+            (rendered if was_rendered else skipped).append(report_name)
+
+    save_manifest(output_dir, manifest)
+    return rendered, skipped
+
+# Function to regenerate the reports at a fixed interval until interrupted
+def run_scheduler(interval, **report_options):
+    next_run = time.monotonic()
+    while True:
+        started = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # A failed run (e.g. a locked database) is reported and retried at the next interval
+        try:
+            rendered, skipped = generate_reports(**report_options)
+            print(f"[{started}] Rendered {len(rendered)} reports, skipped {len(skipped)} unchanged reports")
+        except Exception as error:
+            print(f"[{started}] Report run failed: {error!r}", file=sys.stderr)
+        next_run += interval
+        time.sleep(max(0, next_run - time.monotonic()))
+
+# Function to parse a --watchlist NAME=CVR,CVR,... option
+def parse_watchlist(value):
+    name, separator, cvr_list = value.partition('=')
+    cvr_numbers = [cvr.strip() for cvr in cvr_list.split(',') if cvr.strip()]
+    if not separator or not name.strip() or not cvr_numbers or not all(cvr.isdigit() for cvr in cvr_numbers):
+        raise argparse.ArgumentTypeError("expected NAME=CVR,CVR,...")
+    if name.strip().startswith(USER_WATCHLIST_PREFIX):
+        raise argparse.ArgumentTypeError(f"names starting with '{USER_WATCHLIST_PREFIX}' are reserved for stored user watchlists")
+    return name.strip(), [int(cvr) for cvr in cvr_numbers]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render static sector and watchlist reports.")
+    parser.add_argument('--sector', action='append', choices=list(sector_mappings), help="Sector code to report on (repeatable, defaults to all sectors)")
+    parser.add_argument('--watchlist', action='append', type=parse_watchlist, default=[], help="Named list of companies to report on, as NAME=CVR,CVR,... (repeatable)")
+    parser.add_argument('--user-watchlists', action='store_true', help="Also report on the watchlist of every user")
+    parser.add_argument('--start', type=int, help="First year of the reports (defaults to the first year in the data)")
+    parser.add_argument('--end', type=int, help="Last year of the reports (defaults to the last year in the data)")
+    parser.add_argument('--output', default=REPORTS_DIR, help="Directory to write the reports to")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (defaults to the CPU count)")
+    parser.add_argument('--force', action='store_true', help="Render every report, even if its data is unchanged")
+    parser.add_argument('--every', choices=list(SCHEDULE_INTERVALS), help="Keep running and regenerate the reports at this interval")
+    args = parser.parse_args()
+
+    watchlist_names = [name for name, _ in args.watchlist]
+    if len(set(watchlist_names)) < len(watchlist_names):
+        parser.error("each --watchlist name may only be given once")
+
+    # Reports for watchlists only, unless sectors were requested as well
+    sector_codes = args.sector if args.sector or not (args.watchlist or args.user_watchlists) else []
+    year_range = None
+    if args.start is not None or args.end is not None:
+        min_year, max_year = get_year_range()
+        year_range = (args.start if args.start is not None else min_year, args.end if args.end is not None else max_year)
+    report_options = dict(
+        sector_codes=sector_codes, watchlists=dict(args.watchlist), year_range=year_range,
+        output_dir=args.output, max_workers=args.workers, force=args.force, user_watchlists=args.user_watchlists,
+    )
+
+    if args.every:
+        run_scheduler(SCHEDULE_INTERVALS[args.every], **report_options)
+    else:
+        rendered, skipped = generate_reports(**report_options)
+        print(f"Rendered {len(rendered)} reports, skipped {len(skipped)} unchanged reports in '{args.output}'")
@@ -0,0 +1,188 @@
+# Fuzzy company search across all sectors.
+# Candidates are looked up in a prebuilt SQLite FTS5 trigram index and then re-ranked in memory,
+# so partial names, small typos and (partial) CVR numbers all resolve to the right company.
+# Build or refresh the index with: python search.py --rebuild
+
+# Import the required libraries and modules
+import argparse  # Used for parsing command line options
+import time  # Used for timing searches from the command line
+from functools import lru_cache  # Used for keeping the trigram statistics in memory
+from queries import get_db_connection  # Shared database connection helper
+
+# Names of the full-text index and of its vocabulary table
+SEARCH_TABLE = 'company_search'
+VOCAB_TABLE = 'company_search_vocab'
+
+# Table holding the version of the current index, which changes on every rebuild
+VERSION_TABLE = 'company_search_version'
+
+# Maximum number of candidates fetched from the index before re-ranking
+CANDIDATE_LIMIT = 200
+
+# Number of rarest query trigrams that candidates must all contain for an exact lookup
+EXACT_TRIGRAMS = 3
+
+# Number of rarest query trigrams used to look up candidates for misspelled names
+FUZZY_TRIGRAMS = 6
+
+# Trigrams found in more companies than this are too common to narrow down misspelled names
+MAX_POSTING_SIZE = 20000
+
+# Function to (re)build the trigram index over the names and CVR numbers of all companies.
+# The index is only built from the command line; the rebuild runs in a single transaction,
+# so searches running meanwhile keep using the previous index until it is replaced.
+def build_search_index():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    cursor.execute(f"DROP TABLE IF EXISTS {VOCAB_TABLE}")
+    cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+    cursor.execute(f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(name, cvr, tokenize='trigram')")
+    cursor.execute(f"CREATE VIRTUAL TABLE {VOCAB_TABLE} USING fts5vocab({SEARCH_TABLE}, 'row')")
+    # The index shares rowids with the company table, so results can be joined back to it
+    cursor.execute(f"""
+        INSERT INTO {SEARCH_TABLE} (rowid, name, cvr)
+        SELECT rowid, IFNULL(name, ''), CAST(cvr_number AS TEXT) FROM company
+    """)
+    cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    # Written last, so the index only counts as available once it is complete
+    cursor.execute(f"DROP TABLE IF EXISTS {VERSION_TABLE}")
+    cursor.execute(f"CREATE TABLE {VERSION_TABLE} (version INTEGER NOT NULL)")
+    cursor.execute(f"INSERT INTO {VERSION_TABLE} (version) VALUES (?)", (time.time_ns(),))
+    conn.commit()
+
+# Function to return the version of the index, or None if it has not been built with: python search.py --rebuild
+def search_index_version():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (VERSION_TABLE,))
+    if cursor.fetchone() is None:
+        return None
+    cursor.execute(f"SELECT version FROM {VERSION_TABLE}")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+# Function to check whether the index has been built
+def search_index_available():
+    return search_index_version() is not None
+
+# Function to split a lowercased string into its distinct trigrams
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+# Function to quote a string as an FTS5 phrase
+def _phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+# Function to load the number of companies containing each trigram, once per version of the index.
+# The index is rebuilt by a separate process, so the version tells this one when to reload them.
+@lru_cache(maxsize=1)
+def _trigram_doc_counts(index_version):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT term, doc FROM {VOCAB_TABLE}")
+    return dict(cursor.fetchall())
+
+# Function to fetch the rowids of companies matching an FTS5 query. Results are not ordered by
+# relevance, so SQLite can stop as soon as it has found enough of them.
+def _match_rowids(cursor, match_query, limit):
+    cursor.execute(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH ? LIMIT ?", (match_query, limit))
+    return [row[0] for row in cursor.fetchall()]
+
+# Function to fetch the rowids of companies sharing the most of the given trigrams with the query
+def _fuzzy_rowids(cursor, trigrams, limit):
+    subqueries = ' UNION ALL '.join(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH ?" for _ in trigrams)
+    cursor.execute(f"""
+        SELECT rowid FROM ({subqueries})
+        GROUP BY rowid
+        ORDER BY COUNT(*) DESC
+        LIMIT ?
+    """, [f"name : {_phrase(trigram)}" for trigram in trigrams] + [limit])
+    return [row[0] for row in cursor.fetchall()]
+
+# Function to sort the query trigrams from rarest to most common; trigrams missing from
+# the index cannot match anything (usually the ones containing a typo) and are left out
+def _rare_trigrams(query_trigrams, index_version):
+    doc_counts = _trigram_doc_counts(index_version)
+    known = sorted((doc_counts[trigram], trigram) for trigram in query_trigrams if trigram in doc_counts)
+    return [(trigram, count) for count, trigram in known]
+
+# Function to score how well a company matches the query; higher is better
+def _score(query, query_trigrams, cvr_number, name):
+    name = (name or '').lower()
+    cvr = str(cvr_number)
+    if query == cvr or query == name:
+        return 2.0
+    score = 0.0
+    if cvr.startswith(query) or name.startswith(query):
+        score += 0.5
+    elif query in name or query in cvr:
+        score += 0.3
+    if query_trigrams:
+        name_trigrams = _trigrams(name)
+        shared = len(query_trigrams & name_trigrams)
+        # Share of the query found in the name, with a small preference for shorter names
+        score += shared / len(query_trigrams) + 0.1 * shared / len(query_trigrams | name_trigrams)
+    return score
+
+# Function to search companies by (partial or misspelled) name or CVR number
+def search_companies(query, limit=10):
+    query = ' '.join(query.lower().split())
+    if len(query) < 3:
+        return []
+    index_version = search_index_version()
+    if index_version is None:
+        return []
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    column = 'cvr' if query.isdigit() else 'name'
+
+    query_trigrams = _trigrams(query)
+    rare_trigrams = _rare_trigrams(query_trigrams, index_version)
+
+    # Companies containing the rarest trigrams of the query are cheap to find and cover most searches;
+    # the ranker below decides which of them contain the whole query
+    rowids = []
+    if len(rare_trigrams) == len(query_trigrams):
+        exact_query = ' AND '.join(_phrase(trigram) for trigram, _ in rare_trigrams[:EXACT_TRIGRAMS])
+        rowids = _match_rowids(cursor, f"{column} : ({exact_query})", CANDIDATE_LIMIT)
+        # Too many companies share those trigrams to rank them all, so make sure the companies
+        # starting with or containing the whole query are included
+        if len(rowids) >= CANDIDATE_LIMIT:
+            rowids += _match_rowids(cursor, f"{column} : ^ {_phrase(query)}", CANDIDATE_LIMIT)
+            rowids += _match_rowids(cursor, f"{column} : {_phrase(query)}", CANDIDATE_LIMIT)
+
+    # Fall back to the companies sharing the most rare trigrams with the query to find names with typos
+    if len(set(rowids)) < limit and column == 'name':
+        fuzzy_trigrams = [trigram for trigram, count in rare_trigrams[:FUZZY_TRIGRAMS] if count <= MAX_POSTING_SIZE]
+        fuzzy_trigrams = fuzzy_trigrams or [trigram for trigram, _ in rare_trigrams[:1]]
+        if fuzzy_trigrams:
+            rowids += _fuzzy_rowids(cursor, fuzzy_trigrams, CANDIDATE_LIMIT)
+    if not rowids:
+        return []
+
+    rowids = list(dict.fromkeys(rowids))
+    placeholders = ','.join('?' * len(rowids))
+    cursor.execute(f"SELECT cvr_number, name, industry_sector FROM company WHERE rowid IN ({placeholders})", rowids)
+    ranked = sorted(cursor.fetchall(), key=lambda row: _score(query, query_trigrams, row[0], row[1]), reverse=True)
+    return ranked[:limit]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the company search index or run a search.")
+    parser.add_argument('--rebuild', action='store_true', help="Rebuild the trigram index from the company table")
+    parser.add_argument('query', nargs='?', help="Search for companies by name or CVR number")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        started = time.perf_counter()
+        build_search_index()
+        print(f"Built '{SEARCH_TABLE}' in {time.perf_counter() - started:.1f}s")
+    if args.query and not search_index_available():
+        parser.error("The search index has not been built yet. Run: python search.py --rebuild")
+    if args.query:
+        started = time.perf_counter()
+        results = search_companies(args.query)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        for cvr_number, name, sector in results:
+            print(f"{cvr_number}  {sector}  {name}")
+        print(f"{len(results)} results in {elapsed_ms:.1f} ms")
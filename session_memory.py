@@ -0,0 +1,166 @@
+# Approximate per-session and per-view memory accounting for the Streamlit dashboard.
+# Every session records the size of the DataFrames, styled tables and figures built by
+# the current view, plus a cache of query results that is kept under a per-session budget.
+
+# Import the required libraries and modules
+import os  # Used for reading the configuration from environment variables
+import sys  # Used for measuring the size of plain Python objects
+import threading  # Used for protecting the registry shared by all sessions
+import time  # Used for tracking when sessions were last active
+import numpy as np  # Used for measuring the size of arrays
+import pandas as pd  # Used for measuring the size of DataFrames
+import streamlit as st  # Used for per-session state
+from pandas.io.formats.style import Styler  # Styled DataFrames shown in the dashboard
+from plotly.basedatatypes import BaseFigure  # Plotly figures shown in the dashboard
+from streamlit.runtime.scriptrunner import get_script_run_ctx  # Used for identifying the current session
+
+# Maximum approximate size of the cached results kept by a single session
+SESSION_BUDGET_BYTES = int(float(os.environ.get('DBI_SESSION_MEMORY_BUDGET_MB', '100')) * 1024 * 1024)
+
+# Number of seconds a cached result is reused before it is fetched again, so results rewritten by
+# the batch jobs (analytics.py, watchlist.py) show up in open sessions
+SESSION_CACHE_TTL = int(os.environ.get('DBI_SESSION_CACHE_TTL', '600'))
+
+# Usernames allowed to open the memory usage admin view; nobody unless configured, since anyone can register an account
+ADMIN_USERS = {name.strip() for name in os.environ.get('DBI_ADMIN_USERS', '').split(',') if name.strip()}
+
+# Sessions that have not been active for this many seconds are dropped from the registry
+SESSION_TIMEOUT = 60 * 60
+
+# Session state keys used by this module
+_CACHE_KEY = '_memory_cache'
+_VIEW_KEY = '_memory_view'
+
+# Registry of all sessions in this server process, keyed by session id
+_registry = {}
+_registry_lock = threading.Lock()
+
+# Function to estimate the number of bytes held by an object
+def estimate_size(obj, _seen=None):
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, Styler):
+        return estimate_size(obj.data)
+    if isinstance(obj, BaseFigure):
+        return estimate_size(obj.to_plotly_json())
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+
+    # Walk containers once, so shared objects are only counted one time
+    _seen = set() if _seen is None else _seen
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(key, _seen) + estimate_size(value, _seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _seen) for item in obj)
+    return size
+
+# Function to return the id of the current Streamlit session
+def get_session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else 'no-session'
+
+# Function to get (or create) the registry entry of the current session; the lock must be held
+def _session_entry():
+    session_id = get_session_id()
+    entry = _registry.get(session_id)
+    if entry is None:
+        entry = {'views': {}, 'cache_bytes': 0, 'cache_entries': 0}
+        _registry[session_id] = entry
+    entry['username'] = st.session_state.get('username')
+    entry['current_view'] = st.session_state.get(_VIEW_KEY)
+    entry['last_seen'] = time.time()
+    return entry
+
+# Function to start accounting for a view; objects of the previous rerun are released by now,
+# so the sizes recorded for the views shown before are dropped as well
+def begin_view(view):
+    st.session_state[_VIEW_KEY] = view
+    with _registry_lock:
+        _session_entry()['views'] = {view: 0}
+
+# Function to add the size of an object to the current view and return the object unchanged
+def track(obj):
+    size = estimate_size(obj)
+    with _registry_lock:
+        entry = _session_entry()
+        view = entry['current_view']
+        entry['views'][view] = entry['views'].get(view, 0) + size
+    return obj
+
+# Function to return a cached result for this session, or build and cache it if it is missing or expired
+def cached(key, builder):
+    cache = st.session_state.setdefault(_CACHE_KEY, {})
+    now = time.time()
+    if key in cache and now - cache[key]['created'] <= SESSION_CACHE_TTL:
+        cache[key]['last_used'] = now
+        return cache[key]['value']
+
+    value = builder()
+    cache[key] = {
+        'value': value,
+        'bytes': estimate_size(value),
+        'view': st.session_state.get(_VIEW_KEY),
+        'created': now,
+        'last_used': now,
+    }
+    enforce_budget()
+    return value
+
+# Function to evict the largest cached objects until the session is within its budget
+def enforce_budget(budget=None):
+    budget = SESSION_BUDGET_BYTES if budget is None else budget
+    cache = st.session_state.setdefault(_CACHE_KEY, {})
+    total = sum(item['bytes'] for item in cache.values())
+    for key in sorted(cache, key=lambda k: cache[k]['bytes'], reverse=True):
+        if total <= budget:
+            break
+        total -= cache.pop(key)['bytes']
+
+    with _registry_lock:
+        entry = _session_entry()
+        entry['cache_bytes'] = total
+        entry['cache_entries'] = len(cache)
+    return total
+
+# Function to drop all cached results of the current session
+def clear_session_cache():
+    st.session_state[_CACHE_KEY] = {}
+    enforce_budget()
+
+# Function to check whether the logged in user may open the admin view
+def is_admin():
+    return st.session_state.get('username') in ADMIN_USERS
+
+# Function to summarise the memory usage of every active session
+def session_totals():
+    now = time.time()
+    with _registry_lock:
+        # Forget sessions that have been inactive for too long
+        for session_id in [sid for sid, entry in _registry.items() if now - entry['last_seen'] > SESSION_TIMEOUT]:
+            del _registry[session_id]
+
+        rows = []
+        for session_id, entry in _registry.items():
+            view_bytes = entry['views'].get(entry['current_view'], 0)
+            rows.append((
+                session_id[:8], entry['username'], entry['current_view'], view_bytes,
+                entry['cache_bytes'], entry['cache_entries'], view_bytes + entry['cache_bytes'],
+                time.strftime('%H:%M:%S', time.localtime(entry['last_seen'])),
+            ))
+    return rows
+
+# Function to summarise the memory usage of every view over all active sessions
+def view_totals():
+    totals = {}
+    with _registry_lock:
+        for entry in _registry.values():
+            for view, size in entry['views'].items():
+                sessions, total, largest = totals.get(view, (0, 0, 0))
+                totals[view] = (sessions + 1, total + size, max(largest, size))
+    return [(view, sessions, total, largest) for view, (sessions, total, largest) in totals.items()]
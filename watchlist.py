@@ -0,0 +1,188 @@
+# Per-user watchlists and change detection for the watched companies.
+# The change detection job compares the latest financials of every watched CVR with the snapshot
+# taken by its previous run, keyed by CVR. Each CVR is checked once, however many users watch it,
+# and only CVRs whose financials differ from their snapshot are written back.
+# Run it with: python watchlist.py
+
+# Import the required libraries and modules
+from datetime import datetime  # Used for timestamping snapshots and changes
+from queries import get_db_connection  # Shared database connection helper
+
+# Metrics compared by the change detection job
+METRICS = ['profit_loss', 'equity', 'return_on_assets', 'solvency_ratio']
+
+# How much a metric has to move to be reported: relative to the previous value for amounts,
+# in absolute points for ratios
+CHANGE_THRESHOLDS = {
+    'profit_loss': ('relative', 0.10),
+    'equity': ('relative', 0.10),
+    'return_on_assets': ('absolute', 0.02),
+    'solvency_ratio': ('absolute', 0.05),
+}
+
+# Function to create the watchlist tables if they don't exist
+def setup_watchlist_tables():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS watchlists (
+            username TEXT NOT NULL,
+            cvr INTEGER NOT NULL,
+            added_at TEXT NOT NULL,
+            PRIMARY KEY (username, cvr)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_watchlists_cvr ON watchlists (cvr)")
+    # Last financials seen by the change detection job, one row per watched CVR
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS watchlist_snapshots (
+            cvr INTEGER PRIMARY KEY,
+            year INTEGER,
+            profit_loss REAL,
+            equity REAL,
+            return_on_assets REAL,
+            solvency_ratio REAL,
+            captured_at TEXT NOT NULL
+        )
+    """)
+    # Changes beyond the thresholds, shared by every user watching the CVR
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS watchlist_changes (
+            cvr INTEGER NOT NULL,
+            year INTEGER,
+            metric TEXT NOT NULL,
+            old_value REAL,
+            new_value REAL,
+            detected_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_watchlist_changes_cvr ON watchlist_changes (cvr, detected_at)")
+    conn.commit()
+
+# Function to create the index the change detection job needs on the (large) financials table.
+# It is only created by the job, so logging in to the dashboard never waits for it.
+def setup_financials_index():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    # Lets the job look up the latest year of each watched CVR without scanning all financials
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_financials_cvr_year ON financials (cvr, year)")
+    conn.commit()
+
+# Function to add a company to a user's watchlist; returns False if it was already on it
+def add_to_watchlist(username, cvr_number):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT OR IGNORE INTO watchlists (username, cvr, added_at) VALUES (?, ?, ?)",
+                   (username, cvr_number, datetime.now().isoformat(timespec='seconds')))
+    conn.commit()
+    return cursor.rowcount > 0
+
+# Function to remove companies from a user's watchlist
+def remove_from_watchlist(username, cvr_numbers):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.executemany("DELETE FROM watchlists WHERE username = ? AND cvr = ?", [(username, cvr) for cvr in cvr_numbers])
+    conn.commit()
+
+# Function to fetch the companies on a user's watchlist, ordered by name
+def fetch_watchlist(username):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    query = """
+    SELECT w.cvr, c.name, c.industry_sector, w.added_at
+    FROM watchlists w
+    LEFT JOIN company c ON c.cvr_number = w.cvr
+    WHERE w.username = ?
+    ORDER BY c.name
+    """
+    cursor.execute(query, (username,))
+    return cursor.fetchall()
+
+# Function to fetch every user's watchlist as {username: [cvr, ...]}; also used by the report job,
+# which may run before anyone has logged in to the dashboard
+def fetch_all_watchlists():
+    setup_watchlist_tables()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT username, cvr FROM watchlists ORDER BY username, cvr")
+    watchlists = {}
+    for username, cvr_number in cursor.fetchall():
+        watchlists.setdefault(username, []).append(cvr_number)
+    return watchlists
+
+# Function to fetch the most recent changes of the companies on a user's watchlist, detected since they were added
+def fetch_watchlist_changes(username, limit=100):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    query = """
+    SELECT ch.detected_at, c.name, ch.cvr, ch.year, ch.metric, ch.old_value, ch.new_value
+    FROM watchlist_changes ch
+    JOIN watchlists w ON w.cvr = ch.cvr AND w.username = ? AND ch.detected_at >= w.added_at
+    LEFT JOIN company c ON c.cvr_number = ch.cvr
+    ORDER BY ch.detected_at DESC, c.name
+    LIMIT ?
+    """
+    cursor.execute(query, (username, limit))
+    return cursor.fetchall()
+
+# Function to check whether a metric moved beyond its threshold
+def is_significant_change(metric, old_value, new_value):
+    if old_value is None or new_value is None:
+        return old_value != new_value
+    kind, threshold = CHANGE_THRESHOLDS[metric]
+    if kind == 'absolute':
+        return abs(new_value - old_value) > threshold
+    if old_value == 0:
+        return new_value != 0
+    return abs(new_value - old_value) / abs(old_value) > threshold
+
+# Function to compare the latest financials of every watched CVR with its snapshot
+def detect_changes():
+    setup_watchlist_tables()
+    setup_financials_index()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    columns = ', '.join(METRICS)
+
+    # Latest financials of each distinct watched CVR, however many users watch it
+    cursor.execute(f"""
+        SELECT f.cvr, f.year, {', '.join('f.' + metric for metric in METRICS)}
+        FROM financials f
+        JOIN (
+            SELECT cvr, MAX(year) AS latest_year
+            FROM financials
+            WHERE cvr IN (SELECT DISTINCT cvr FROM watchlists)
+            GROUP BY cvr
+        ) AS latest ON f.cvr = latest.cvr AND f.year = latest.latest_year
+    """)
+    latest = {row[0]: row[1:] for row in cursor.fetchall()}
+
+    cursor.execute(f"""
+        SELECT cvr, year, {columns}
+        FROM watchlist_snapshots
+        WHERE cvr IN (SELECT DISTINCT cvr FROM watchlists)
+    """)
+    snapshots = {row[0]: row[1:] for row in cursor.fetchall()}
+
+    now = datetime.now().isoformat(timespec='seconds')
+    new_snapshots = []
+    changes = []
+    for cvr_number, current in latest.items():
+        previous = snapshots.get(cvr_number)
+        if previous == current:
+            continue  # Unchanged since the last run, nothing to compare
+        new_snapshots.append((cvr_number,) + current + (now,))
+        if previous is None:
+            continue  # First time this CVR is watched; the snapshot is the baseline
+        for i, metric in enumerate(METRICS, start=1):
+            if is_significant_change(metric, previous[i], current[i]):
+                changes.append((cvr_number, current[0], metric, previous[i], current[i], now))
+
+    cursor.executemany(f"INSERT OR REPLACE INTO watchlist_snapshots (cvr, year, {columns}, captured_at) VALUES (?, ?, ?, ?, ?, ?, ?)", new_snapshots)
+    cursor.executemany("INSERT INTO watchlist_changes (cvr, year, metric, old_value, new_value, detected_at) VALUES (?, ?, ?, ?, ?, ?)", changes)
+    conn.commit()
+    return len(latest), len(new_snapshots), changes
+
+if __name__ == "__main__":
+    checked, updated, changes = detect_changes()
+    print(f"Checked {checked} watched companies, {updated} had new financials, {len(changes)} changes beyond thresholds")